@@ -1,17 +1,66 @@
 import sys
 import socket
-import json
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout,
     QLineEdit, QPushButton, QListWidget, QLabel, QMessageBox
 )
 from PySide6.QtGui import QFont
 
+from protocol import dumps, loads, recv_message, send_message
+
+# Seconds a query waits on the server, for each connect, send or receive, before giving up
+SERVER_TIMEOUT = 10
+
 # Use a fixed-width font (Monaco or fallback)
 fixed_font = QFont("Monaco")
 fixed_font.setStyleHint(QFont.StyleHint.TypeWriter)
 fixed_font.setFixedPitch(True)
 
+# Formats one row of the results table: Label, Date, Produced By and Classified As, each
+# truncated and left-justified to its column width
+format_row = "{:<30.30}{:<15.15}{:<40.40}{:<30.30}".format
+
+def format_producers(producers):
+    """
+    Returns the (part, name, nationalities, timespan) lists from a result's produced_by as a
+    comma-separated list of agent names, each followed by the part it produced.
+    """
+    return ", ".join(f"{name} ({part})" if part else name for part, name, _, _ in producers)
+
+class QuerySignals(QObject):
+    """
+    Signals a QueryTask emits back to the GUI thread: finished with the server's decoded
+    response, or failed with the error message if the server could not be reached.
+    """
+    finished = Signal(object)
+    failed = Signal(str)
+
+class QueryTask(QRunnable):
+    """Runs one query against the server on a thread pool thread, off the GUI thread."""
+
+    def __init__(self, host, port, filters):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.filters = filters
+        self.signals = QuerySignals()
+
+    def run(self):
+        """Sends the filters to the server and emits its response, or the error if it fails."""
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                # Give up on a server that accepts but never answers, so the task always ends
+                # in finished or failed and the submit button is re-enabled
+                s.settimeout(SERVER_TIMEOUT)
+                s.connect((self.host, self.port))
+                send_message(s, dumps(self.filters))
+                response = loads(recv_message(s))
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.finished.emit(response)
+
 class MainWindow(QWidget):
     def __init__(self, host, port):
         super().__init__()
@@ -71,6 +120,10 @@ class MainWindow(QWidget):
         self.results_list.itemDoubleClicked.connect(self.show_details)
 
     def submit_query(self):
+        """Sends the entered filters to the server on a background thread."""
+        # Only one query runs at a time; the button is re-enabled when it finishes
+        if not self.submit_button.isEnabled():
+            return
         # Collect filter criteria from the fields
         filters = {
             "label": self.label_edit.text().strip(),
@@ -78,47 +131,38 @@ class MainWindow(QWidget):
             "agent": self.agent_edit.text().strip(),
             "date": self.date_edit.text().strip()
         }
-        request_json = json.dumps(filters)
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((self.host, self.port))
-            s.sendall(request_json.encode("utf-8"))
-            # Read until EOF
-            response_chunks = []
-            while True:
-                chunk = s.recv(4096)
-                if not chunk:
-                    break
-                response_chunks.append(chunk)
-            s.close()
-            response_json = b"".join(response_chunks).decode("utf-8")
-            response = json.loads(response_json)
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error connecting to server: {e}")
-            return
-
+        task = QueryTask(self.host, self.port, filters)
+        task.signals.finished.connect(self.show_results)
+        task.signals.failed.connect(self.show_connection_error)
+        self.submit_button.setEnabled(False)
+        QThreadPool.globalInstance().start(task)
+
+    def show_connection_error(self, message):
+        """Re-enables the submit button and reports that the server could not be reached."""
+        self.submit_button.setEnabled(True)
+        QMessageBox.critical(self, "Error", f"Error connecting to server: {message}")
+
+    def show_results(self, response):
+        """Re-enables the submit button and fills the list with the rows in response."""
+        self.submit_button.setEnabled(True)
         # Clear previous results and populate new ones.
         self.results_list.clear()
         if "error" in response:
             QMessageBox.critical(self, "Server Error", response["error"])
             return
 
+        # Results arrive sorted by label (case-insensitive) from the server
         results = response.get("results", [])
-        # Sort results by label (ascending)
-        results.sort(key=lambda r: r.get("label", "").lower())
-
-        # Format header row and add as first two items.
-        header = f"{'Label'.ljust(30)}{'Date'.ljust(15)}{'Produced By'.ljust(40)}{'Classified As'.ljust(30)}"
-        self.results_list.addItem(header)
-        self.results_list.addItem("-" * len(header))
-        for res in results:
-            # For each result, extract fields.
-            label = (res.get("label") or "")[:30].ljust(30)
-            date = (res.get("date") or "")[:15].ljust(15)
-            produced_by = (res.get("produced_by") or "")[:40].ljust(40)
-            classified_as = (res.get("classified_as") or "")[:30].ljust(30)
-            line = f"{label}{date}{produced_by}{classified_as}"
-            self.results_list.addItem(line)
+
+        # Format header row and add as first two items, followed by one line per result.
+        header = format_row("Label", "Date", "Produced By", "Classified As")
+        lines = [
+            format_row(res.get("label") or "", res.get("date") or "",
+                       format_producers(res.get("produced_by") or []),
+                       ", ".join((res.get("classified_as") or "").splitlines()))
+            for res in results
+        ]
+        self.results_list.addItems([header, "-" * len(header), *lines])
 
     def show_details(self, item):
         # In a complete solution, you would extract the object ID and show a detail dialog.
@@ -1,21 +1,284 @@
 #!/usr/bin/env python3
+import os
 import socket
 import sys
-import json
 import sqlite3
 import argparse
+import itertools
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from protocol import dumps, loads, recv_message, send_message
 
 DATABASE = "lux.sqlite"
+DATABASE_URI = f"file:{DATABASE}?mode=ro"
+# For create_indexes, which writes to the database but must not create it if it is missing
+DATABASE_RW_URI = f"file:{DATABASE}?mode=rw"
+
+# Number of client connections handled concurrently
+MAX_WORKERS = 16
+
+# Seconds a worker waits on a silent client before giving up on it
+CLIENT_TIMEOUT = 5
+
+# Largest request accepted, in bytes; real requests are a few hundred bytes of filters
+MAX_REQUEST_SIZE = 64 * 1024
+
+# Settings applied once to each read connection
+PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA cache_size=-131072;
+    PRAGMA mmap_size=1073741824;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA query_only=1;
+"""
+
+# Indexes on the join and filter columns used by the queries below
+INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_prod_obj ON productions(obj_id);
+    CREATE INDEX IF NOT EXISTS idx_prod_agt ON productions(agt_id);
+    CREATE INDEX IF NOT EXISTS idx_oc_obj ON objects_classifiers(obj_id);
+    CREATE INDEX IF NOT EXISTS idx_oc_cls ON objects_classifiers(cls_id);
+    CREATE INDEX IF NOT EXISTS idx_an_agt ON agents_nationalities(agt_id);
+    CREATE INDEX IF NOT EXISTS idx_agents_name ON agents(name COLLATE NOCASE);
+    CREATE INDEX IF NOT EXISTS idx_objects_label ON objects(label COLLATE NOCASE);
+"""
+
+# Trigram indexes over the large text columns searched with LIKE '%needle%': obj_fts indexes
+# objects.label and objects.date (rowid = objects.id) and agent_trgm indexes agents.name
+# (rowid = agents.id). The trigram tokenizer lets FTS5 answer case-insensitive substring LIKEs
+# from the index instead of a table scan. Agents get their own table rather than a per-object
+# list of names so that a pattern can only ever match within a single name. Classifiers are few
+# enough that a plain scan of their table is cheap.
+# Both are external-content tables, so they store only the index and not a second copy of the
+# text, and triggers keep them up to date as objects and agents are changed.
+SEARCH_INDEX = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS obj_fts USING fts5(
+        label, date, content='objects', content_rowid='id', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS obj_fts_insert AFTER INSERT ON objects BEGIN
+        INSERT INTO obj_fts(rowid, label, date) VALUES (new.id, new.label, new.date);
+    END;
+    CREATE TRIGGER IF NOT EXISTS obj_fts_delete AFTER DELETE ON objects BEGIN
+        INSERT INTO obj_fts(obj_fts, rowid, label, date)
+            VALUES ('delete', old.id, old.label, old.date);
+    END;
+    CREATE TRIGGER IF NOT EXISTS obj_fts_update AFTER UPDATE ON objects BEGIN
+        INSERT INTO obj_fts(obj_fts, rowid, label, date)
+            VALUES ('delete', old.id, old.label, old.date);
+        INSERT INTO obj_fts(rowid, label, date) VALUES (new.id, new.label, new.date);
+    END;
+    CREATE VIRTUAL TABLE IF NOT EXISTS agent_trgm USING fts5(
+        name, content='agents', content_rowid='id', tokenize='trigram'
+    );
+    CREATE TRIGGER IF NOT EXISTS agent_trgm_insert AFTER INSERT ON agents BEGIN
+        INSERT INTO agent_trgm(rowid, name) VALUES (new.id, new.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS agent_trgm_delete AFTER DELETE ON agents BEGIN
+        INSERT INTO agent_trgm(agent_trgm, rowid, name) VALUES ('delete', old.id, old.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS agent_trgm_update AFTER UPDATE ON agents BEGIN
+        INSERT INTO agent_trgm(agent_trgm, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO agent_trgm(rowid, name) VALUES (new.id, new.name);
+    END;
+"""
+
+# Each search table in SEARCH_INDEX and the table whose rows it indexes
+_SEARCH_TABLES = (("obj_fts", "objects"), ("agent_trgm", "agents"))
+
+# Each object's position (rank) in the order results are returned in, so that the first 1000
+# matches can be read in order straight off obj_sort's primary key instead of sorting every match
+# by casefold(label). The ranks are computed in Python by _sync_sort_table, so any change to
+# objects just empties the table, and queries fall back to sorting until the next rebuild.
+SORT_INDEX = """
+    CREATE TABLE IF NOT EXISTS obj_sort(
+        rank INTEGER PRIMARY KEY,
+        obj_id INTEGER NOT NULL UNIQUE
+    );
+    CREATE TRIGGER IF NOT EXISTS obj_sort_insert AFTER INSERT ON objects BEGIN
+        DELETE FROM obj_sort;
+    END;
+    CREATE TRIGGER IF NOT EXISTS obj_sort_delete AFTER DELETE ON objects BEGIN
+        DELETE FROM obj_sort;
+    END;
+    CREATE TRIGGER IF NOT EXISTS obj_sort_update AFTER UPDATE OF id, label, date ON objects BEGIN
+        DELETE FROM obj_sort;
+    END;
+"""
+
+_local = threading.local()
+
+# Connections currently being served, so shutting down can unblock their workers
+_open_connections = set()
+_open_connections_lock = threading.Lock()
+
+# The signature (see _database_signature) of the database that the response cache and the open
+# connections reflect, and a count of the changes to it seen so far
+_database_state = {"signature": None, "generation": 0}
+_database_lock = threading.Lock()
+
+
+def _casefold(text):
+    """Returns text casefolded, so SQL can sort by the same key as str.casefold in Python."""
+    return text.casefold() if isinstance(text, str) else text
+
+
+def _sort_key(row):
+    """
+    Returns the key for an (id, label, date) row that orders it the way _ORDER_CLAUSE does:
+    by casefolded label, then label, then date, with NULLs first.
+    """
+    obj_id, label, date = row
+    return (label is not None, _casefold(label) or "", label or "",
+            date is not None, date or "", obj_id)
+
+
+def _sort_table_complete(conn):
+    """Returns whether the database has an obj_sort table that ranks every object."""
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'obj_sort'"
+    ).fetchone() is None:
+        return False
+    return conn.execute(
+        "SELECT (SELECT count(*) FROM obj_sort) = (SELECT count(*) FROM objects)"
+    ).fetchone()[0] == 1
+
 
 def connect_database():
-    """Returns a connection to the SQLite database."""
+    """
+    Returns the calling thread's read-only connection to the SQLite database, opening it on
+    first use and reopening it after check_database sees the database change. Connections are
+    kept open so SQLite's page cache stays warm across requests, and memory-map the file so that
+    all of them share the OS page cache without read() calls.
+    Also records in _local.search_index whether the database has the trigram search tables and in
+    _local.sort_index whether obj_sort is complete, and registers the casefold() SQL function
+    used for sorting without it.
+    Raises sqlite3.Error if the database cannot be opened.
+    """
+    conn = getattr(_local, "conn", None)
+    generation = _database_state["generation"]
+    if conn is not None and _local.generation != generation:
+        # The database has been changed or replaced since this connection was opened
+        conn.close()
+        conn = None
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_URI, check_same_thread=False, uri=True,
+                               isolation_level=None)
+        conn.executescript(PRAGMAS)
+        conn.create_function("casefold", 1, _casefold, deterministic=True)
+        _local.search_index = conn.execute(
+            "SELECT count(*) FROM sqlite_master"
+            " WHERE type = 'table' AND name IN ('obj_fts', 'agent_trgm')"
+        ).fetchone()[0] == 2
+        _local.sort_index = _sort_table_complete(conn)
+        _local.generation = generation
+        _local.conn = conn
+    return conn
+
+
+def _drop_old_search_tables(conn):
+    """
+    Drops search tables left by earlier versions of the server, which kept their own copy of the
+    text and were never updated, so that SEARCH_INDEX recreates them as external-content tables.
+    """
+    for fts_table, _ in _SEARCH_TABLES:
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+        ).fetchone()
+        if row and "content=" not in row[0]:
+            conn.execute(f"DROP TABLE {fts_table}")
+
+
+def _sync_search_tables(conn):
+    """
+    Rebuilds any search table whose index does not cover exactly the rows of its content table,
+    as when it was just created or its table was changed without the triggers (e.g. by a copy
+    of the database made before they existed).
+    """
+    for fts_table, content_table in _SEARCH_TABLES:
+        indexed = conn.execute(f"SELECT count(*), max(id) FROM {fts_table}_docsize").fetchone()
+        current = conn.execute(f"SELECT count(*), max(id) FROM {content_table}").fetchone()
+        if indexed != current:
+            conn.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+    conn.commit()
+
+
+def _sync_sort_table(conn):
+    """Ranks every object in obj_sort, unless it already does."""
+    if _sort_table_complete(conn):
+        return
+    rows = conn.execute("SELECT id, label, date FROM objects").fetchall()
+    rows.sort(key=_sort_key)
+    conn.execute("DELETE FROM obj_sort")
+    conn.executemany("INSERT INTO obj_sort(obj_id) VALUES (?)", ((row[0],) for row in rows))
+    conn.commit()
+
+
+def create_indexes():
+    """
+    Creates the indexes, the trigram search tables and obj_sort used by the server's queries if
+    they do not already exist, rebuilds any of them that have drifted from the data, and switches
+    the database to WAL journaling (which, unlike the other pragmas, needs write access and
+    persists in the file).
+    Failure (e.g. a read-only or missing database file) is reported but not fatal; queries then
+    fall back to scanning with LIKE, or fail until the database reappears.
+    """
     try:
-        return sqlite3.connect(DATABASE)
+        conn = sqlite3.connect(DATABASE_RW_URI, uri=True)
     except sqlite3.Error as e:
         sys.stderr.write(f"Database error: {e}\n")
-        sys.exit(1)
+        return
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(INDEXES)
+        _drop_old_search_tables(conn)
+        conn.executescript(SEARCH_INDEX)
+        _sync_search_tables(conn)
+        conn.executescript(SORT_INDEX)
+        _sync_sort_table(conn)
+    except sqlite3.Error as e:
+        sys.stderr.write(f"Could not create indexes: {e}\n")
+    finally:
+        conn.close()
+
+
+def _database_signature():
+    """
+    Returns the (inode, modification time, size) of the database file and of its write-ahead log,
+    or None for each that does not exist, which changes whenever the database is written to or
+    replaced.
+    """
+    signature = []
+    for path in (DATABASE, DATABASE + "-wal"):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
 
 
+def check_database():
+    """
+    Returns the current database generation. If the database has been changed, replaced or
+    removed since the last call, first brings its indexes up to date with create_indexes, clears
+    the response cache and starts a new generation, so every thread reopens its connection.
+    """
+    if _database_signature() != _database_state["signature"]:
+        with _database_lock:
+            # Only the first thread to see the change rebuilds; the rest find it already done
+            if _database_signature() != _database_state["signature"]:
+                create_indexes()
+                _database_state["signature"] = _database_signature()
+                _database_state["generation"] += 1
+                _cached_response.cache_clear()
+    return _database_state["generation"]
+
+
+@lru_cache(maxsize=4096)
 def build_timespan_str(bdate, edate):
     """
     Builds a timespan string (e.g., "-0580 – -0550" or "1976–") from the agent’s dates.
@@ -46,141 +309,318 @@ def build_timespan_str(bdate, edate):
 
 
 
-def fetch_nationalities(cursor, agt_id):
+def _id_array(ids):
+    """
+    Returns the given integer ids as a JSON array string, to be bound to a single "?" and
+    expanded with json_each. Unlike one placeholder per id, this keeps the statement text the
+    same however many ids there are, so sqlite3's prepared-statement cache is hit.
     """
-    Retrieves a sorted list (case-insensitive) of nationality descriptors for the given agent.
-    Queries the agents_nationalities table joined with nationalities.
+    return f"[{','.join(map(str, ids))}]"
+
+
+def fetch_nationalities(conn, agt_ids):
     """
+    Retrieves nationality descriptors for the given agents in a single query.
+    Returns a dict mapping each agent id to a sorted list (case-insensitive) of descriptors.
+    """
+    nationalities = {agt_id: [] for agt_id in agt_ids}
+    if not agt_ids:
+        return nationalities
     q = """
-        SELECT nationalities.descriptor
+        SELECT agents_nationalities.agt_id, nationalities.descriptor
         FROM agents_nationalities
         JOIN nationalities ON nationalities.id = agents_nationalities.nat_id
-        WHERE agents_nationalities.agt_id = ?
+        WHERE agents_nationalities.agt_id IN (SELECT value FROM json_each(?))
     """
-    cursor.execute(q, (agt_id,))
-    rows = cursor.fetchall()
-    descs = [r[0] for r in rows if r[0]]
-    return sorted(descs, key=str.lower)
+    for agt_id, desc in conn.execute(q, (_id_array(agt_ids),)).fetchall():
+        if desc:
+            nationalities[agt_id].append(desc)
+    for descs in nationalities.values():
+        descs.sort(key=str.casefold)
+    return nationalities
 
 
-def get_producers(cursor, obj_id):
+def get_producers(conn, obj_ids):
     """
-    Retrieves producers for the given object.
-    Returns a list of tuples: (Part, Name, Nationalities, Timespan).
-    Sorted in ascending order by agent name, then part, and then by the nationality string.
+    Retrieves producers for all of the given objects.
+    Returns a dict mapping each object id to a list of tuples:
+    (Part, Name, Nationalities, Timespan).
+    Each list is sorted in ascending order (case-insensitive) by agent name, then part, and then
+    by the nationality string.
     """
+    producers = {obj_id: [] for obj_id in obj_ids}
+    if not obj_ids:
+        return producers
     query = """
-        SELECT agents.name, productions.part, agents.begin_date, agents.end_date, agents.id
+        SELECT productions.obj_id, agents.id, agents.name, productions.part,
+            agents.begin_date, agents.end_date
         FROM productions
         JOIN agents ON productions.agt_id = agents.id
-        WHERE productions.obj_id = ?
-        ORDER BY agents.name ASC, productions.part ASC
+        WHERE productions.obj_id IN (SELECT value FROM json_each(?))
     """
-    cursor.execute(query, (obj_id,))
-    rows = cursor.fetchall()
-    data = []
-    for name, part, bdate, edate, agt_id in rows:
-        timespan = build_timespan_str(bdate, edate)
-        # Join nationalities with newline characters
-        nat_list = fetch_nationalities(cursor, agt_id)
-        nat_str = "\n".join(nat_list)
-        data.append((part or "", name, nat_str, timespan))
-    # Sort again to ensure correct order
-    data.sort(key=lambda x: (x[1].lower(), x[0].lower(), x[2].lower()))
-    return data
+    rows = conn.execute(query, (_id_array(obj_ids),)).fetchall()
+    # Join nationalities with newline characters, once per agent rather than once per production
+    nat_strs = {
+        agt_id: "\n".join(descs)
+        for agt_id, descs in fetch_nationalities(conn, {row[1] for row in rows}).items()
+    }
+    # Bind the lookups used in the loop to locals, since it runs once per production
+    timespan_str = build_timespan_str
+    for obj_id, agt_id, name, part, bdate, edate in rows:
+        producers[obj_id].append((part or "", name, nat_strs[agt_id], timespan_str(bdate, edate)))
+    # Sort by the casefolded keys, computed once per producer, so ordering is case-insensitive for
+    # all of Unicode and matches the nationality and classifier sorts; the exact name and part
+    # break ties between producers that differ only in case
+    for data in producers.values():
+        data.sort(key=lambda x: (x[1].casefold(), x[0].casefold(), x[2].casefold(), x[1], x[0]))
+    return producers
 
 
-def get_classifications(cursor, obj_id):
+def get_classifications(conn, obj_ids):
     """
-    Retrieves a sorted (alphabetically, case-insensitive) list of classifier names for the object.
-    Returns a newline-separated string where each classifier appears on its own line.
+    Retrieves classifier names for all of the given objects.
+    Returns a dict mapping each object id to a newline-separated string where each classifier
+    appears on its own line, sorted alphabetically (case-insensitive).
     """
-    query = """
-        SELECT classifiers.name
-        FROM objects_classifiers
-        JOIN classifiers ON objects_classifiers.cls_id = classifiers.id
-        WHERE objects_classifiers.obj_id = ?
+    classifiers = {obj_id: [] for obj_id in obj_ids}
+    if obj_ids:
+        query = """
+            SELECT objects_classifiers.obj_id, classifiers.name
+            FROM objects_classifiers
+            JOIN classifiers ON objects_classifiers.cls_id = classifiers.id
+            WHERE objects_classifiers.obj_id IN (SELECT value FROM json_each(?))
+        """
+        for obj_id, name in conn.execute(query, (_id_array(obj_ids),)).fetchall():
+            if name:
+                classifiers[obj_id].append(name)
+    return {
+        obj_id: "\n".join(sorted(names, key=str.casefold))
+        for obj_id, names in classifiers.items()
+    }
+
+
+# Base query for fetch_filtered_objects, before any filters are applied
+_OBJECTS_QUERY = """
+    SELECT objects.id, objects.label, objects.date
+    FROM objects
+    WHERE 1=1
+"""
+
+# The same query reading objects in rank order through obj_sort
+_RANKED_OBJECTS_QUERY = """
+    SELECT objects.id, objects.label, objects.date
+    FROM obj_sort
+    JOIN objects ON objects.id = obj_sort.obj_id
+    WHERE 1=1
+"""
+
+# For each filter field, in the order they are applied: the WHERE clause used without the search
+# tables, and the one used with them (None if the field has none). Each takes one LIKE parameter.
+_FILTER_CLAUSES = (
+    ("date", " AND objects.date LIKE ?",
+     " AND objects.id IN (SELECT rowid FROM obj_fts WHERE date LIKE ?)"),
+    ("agent", """
+        AND objects.id IN (
+            SELECT obj_id FROM productions
+            JOIN agents ON productions.agt_id = agents.id
+            WHERE agents.name LIKE ?
+        )
+    """, """
+        AND objects.id IN (
+            SELECT obj_id FROM productions
+            WHERE agt_id IN (SELECT rowid FROM agent_trgm WHERE name LIKE ?)
+        )
+    """),
+    ("classifier", """
+        AND objects.id IN (
+            SELECT obj_id FROM objects_classifiers
+            JOIN classifiers ON objects_classifiers.cls_id = classifiers.id
+            WHERE classifiers.name LIKE ?
+        )
+    """, None),
+    ("label", " AND objects.label LIKE ?",
+     " AND objects.id IN (SELECT rowid FROM obj_fts WHERE label LIKE ?)"),
+)
+
+# casefold() keys sort case-insensitively for all of Unicode (COLLATE NOCASE only folds ASCII)
+_ORDER_CLAUSE = (
+    " ORDER BY casefold(objects.label), objects.label, objects.date ASC LIMIT 1000"
+)
+
+# The same order, precomputed in obj_sort
+_RANKED_ORDER_CLAUSE = " ORDER BY obj_sort.rank LIMIT 1000"
+
+
+def _build_objects_query(fields, ranked):
+    """
+    Returns the objects query filtering on each of the given (field, use_search_index) pairs,
+    either through the trigram search tables or with a plain LIKE, and sorting through obj_sort
+    if ranked is true.
     """
-    cursor.execute(query, (obj_id,))
-    rows = cursor.fetchall()
-    classifiers = [r[0] for r in rows if r[0]]
-    classifiers_sorted = sorted(classifiers, key=lambda s: s.lower())
-    return "\n".join(classifiers_sorted)
+    clauses = "".join(
+        search_clause if (field, True) in fields else clause
+        for field, clause, search_clause in _FILTER_CLAUSES
+        if (field, True) in fields or (field, False) in fields
+    )
+    if ranked:
+        return _RANKED_OBJECTS_QUERY + clauses + _RANKED_ORDER_CLAUSE
+    return _OBJECTS_QUERY + clauses + _ORDER_CLAUSE
+
+
+# Every combination of filter fields, each either absent or searched with or without the search
+# index, and of sorting with or without obj_sort, mapped to its query. The queries are built once
+# so that each request reuses the same statement text (and so sqlite3's prepared-statement cache)
+# instead of rebuilding it.
+_STMT_CACHE = {
+    (frozenset(fields), ranked): _build_objects_query(frozenset(fields), ranked)
+    for choices in itertools.product(*(
+        [None, (field, False)] + ([(field, True)] if search_clause else [])
+        for field, _, search_clause in _FILTER_CLAUSES
+    ))
+    for fields in [[choice for choice in choices if choice]]
+    for ranked in (False, True)
+}
+
+# A run of three characters with no LIKE wildcards: the trigram index can only narrow down (and
+# FTS5 in SQLite 3.40 only reliably handles) patterns that contain at least one
+_TRIGRAM = re.compile(r"[^%_]{3}")
+
+# Filter fields that can be answered from the trigram search tables
+_SEARCHABLE_FIELDS = frozenset(
+    field for field, _, search_clause in _FILTER_CLAUSES if search_clause
+)
+
+# Per-object fields that are looked up separately and can be left out via filters["include"]
+OPTIONAL_FIELDS = ("produced_by", "classified_as")
 
 
 def fetch_filtered_objects(filters):
     """
     Performs a filtered query on the objects table.
+    Yields one dict per matching object, sorted (case-insensitive) by label, then date.
+    If filters has an "include" list, only the OPTIONAL_FIELDS named in it are looked up and
+    returned; otherwise all of them are.
     """
     conn = connect_database()
-    cursor = conn.cursor()
-    query = """
-        SELECT objects.id, objects.label, objects.date
-        FROM objects
-        WHERE 1=1
-    """
-    params = []
-    if filters.get("date"):
-        query += " AND objects.date LIKE ?"
-        params.append(f"%{filters['date']}%")
-    if filters.get("agent"):
-        query += """
-            AND objects.id IN (
-                SELECT obj_id FROM productions
-                JOIN agents ON productions.agt_id = agents.id
-                WHERE agents.name LIKE ?
-            )
-        """
-        params.append(f"%{filters['agent']}%")
-    if filters.get("classifier"):
-        query += """
-            AND objects.id IN (
-                SELECT obj_id FROM objects_classifiers
-                JOIN classifiers ON objects_classifiers.cls_id = classifiers.id
-                WHERE classifiers.name LIKE ?
-            )
-        """
-        params.append(f"%{filters['classifier']}%")
-    if filters.get("label"):
-        query += " AND objects.label LIKE ?"
-        params.append(f"%{filters['label']}%")
-    query += " ORDER BY objects.label ASC, objects.date ASC LIMIT 1000"
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    results = []
+    # Non-string filter values (e.g. numbers) are searched for as text
+    values = {
+        field: str(filters[field]) for field, _, _ in _FILTER_CLAUSES if filters.get(field)
+    }
+    query = _STMT_CACHE[frozenset(
+        (field, _local.search_index and field in _SEARCHABLE_FIELDS
+         and _TRIGRAM.search(value) is not None)
+        for field, value in values.items()
+    ), _local.sort_index]
+    params = [f"%{value}%" for value in values.values()]
+    rows = conn.execute(query, params).fetchall()
+    include = filters.get("include", OPTIONAL_FIELDS)
+    # Fetch producers and classifiers for every matched object at once rather than per row
+    obj_ids = [row[0] for row in rows]
+    lookups = []
+    if "produced_by" in include:
+        lookups.append(("produced_by", get_producers(conn, obj_ids)))
+    if "classified_as" in include:
+        lookups.append(("classified_as", get_classifications(conn, obj_ids)))
     for obj_id, label, date in rows:
-        produced_by = get_producers(cursor, obj_id)
-        classified_as = get_classifications(cursor, obj_id)
-        results.append({
-            "id": obj_id,
-            "label": label,
-            "date": date,
-            "produced_by": produced_by,
-            "classified_as": classified_as
-        })
-    conn.close()
-    return results
+        result = {"id": obj_id, "label": label, "date": date}
+        for field, values in lookups:
+            result[field] = values[obj_id]
+        yield result
+
+def encode_results(results):
+    """
+    Yields the JSON encoding of a {"results": [...]} response piece by piece, one object at a
+    time, so the full list of results never has to be held in memory alongside its encoding.
+    """
+    encode = dumps
+    results = iter(results)
+    yield b'{"results":['
+    for result in results:
+        yield encode(result)
+        break
+    for result in results:
+        yield b","
+        yield encode(result)
+    yield b"]}"
+
+@lru_cache(maxsize=256)
+def _cached_response(filter_key, _generation):
+    """
+    Returns the serialized JSON response for the filters in filter_key, a tuple of (field, value)
+    pairs as built by request_key, as bytes ready for send_message.
+    _generation is the database generation from check_database, so that a response computed
+    before the database last changed is never served.
+    """
+    return b"".join(encode_results(fetch_filtered_objects(dict(filter_key))))
+
+def validate_request(request):
+    """
+    Returns an error message describing what is wrong with request, or None if it is valid.
+    """
+    if not isinstance(request, dict):
+        return "Request must be a JSON object"
+    for field, _, _ in _FILTER_CLAUSES:
+        if isinstance(request.get(field), (dict, list)):
+            return f"Filter {field!r} must be a string"
+    include = request.get("include", [])
+    if not isinstance(include, list) or not all(field in OPTIONAL_FIELDS for field in include):
+        return f"'include' must be a list of fields from {list(OPTIONAL_FIELDS)}"
+    return None
+
+def request_key(request):
+    """
+    Returns the filters of a valid request in normalized form, as a tuple of (field, value) pairs
+    that can key the response cache: each non-empty filter value as a string, and the fields to
+    include as a tuple of the OPTIONAL_FIELDS named (all of them by default), in a fixed order.
+    Other fields are ignored.
+    """
+    include = request.get("include", OPTIONAL_FIELDS)
+    return tuple(
+        (field, str(request[field])) for field, _, _ in _FILTER_CLAUSES if request.get(field)
+    ) + (("include", tuple(field for field in OPTIONAL_FIELDS if field in include)),)
 
 def handle_client(conn):
     """
     Handles a single client connection.
-    Reads the complete request, performs the query, sends back a JSON response.
+    Reads one length-prefixed request, performs the query, sends back a length-prefixed
+    JSON response.
     """
-    data = b""
-    while True:
-        chunk = conn.recv(4096)
-        if not chunk:
-            break
-        data += chunk
+    data = recv_message(conn, MAX_REQUEST_SIZE)
     try:
-        request = json.loads(data.decode("utf-8"))
+        request = loads(data)
     except Exception as e:
         response = {"error": f"Invalid JSON: {e}"}
-        conn.sendall(json.dumps(response).encode("utf-8"))
+        send_message(conn, dumps(response))
+        return
+    error = validate_request(request)
+    if error:
+        send_message(conn, dumps({"error": error}))
+        return
+    try:
+        response = _cached_response(request_key(request), check_database())
+    except sqlite3.Error as e:
+        send_message(conn, dumps({"error": f"Database error: {e}"}))
         return
-    results = fetch_filtered_objects(request)
-    response = {"results": results}
-    conn.sendall(json.dumps(response).encode("utf-8"))
+    send_message(conn, response)
+
+def serve_client(conn):
+    """
+    Runs handle_client on a worker thread, reporting any error and closing the connection.
+    """
+    with _open_connections_lock:
+        _open_connections.add(conn)
+    with conn:
+        try:
+            conn.settimeout(CLIENT_TIMEOUT)
+            # Send the last partial segment of a large response right away instead of holding it
+            # back until the client acknowledges the segments before it
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            handle_client(conn)
+        except Exception as e:
+            sys.stderr.write(f"Error handling request: {e}\n")
+        finally:
+            with _open_connections_lock:
+                _open_connections.discard(conn)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -195,18 +635,27 @@ def main():
     except Exception as e:
         sys.stderr.write(f"Error binding to port {args.port}: {e}\n")
         sys.exit(1)
-    sock.listen(5)
+    check_database()
+    sock.listen(128)
     print(f"Server listening on port {args.port}...")
+    pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
     while True:
         try:
-            conn, addr = sock.accept()
-            with conn:
-                handle_client(conn)
+            conn, _ = sock.accept()
+            pool.submit(serve_client, conn)
         except KeyboardInterrupt:
             print("Server shutting down...")
             break
         except Exception as e:
-            sys.stderr.write(f"Error handling request: {e}\n")
+            sys.stderr.write(f"Error accepting connection: {e}\n")
+    # Drop queued connections and cut off running ones rather than wait for them
+    pool.shutdown(wait=False, cancel_futures=True)
+    with _open_connections_lock:
+        for conn in _open_connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
     sock.close()
 
 if __name__ == "__main__":
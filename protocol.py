@@ -0,0 +1,78 @@
+"""Message framing and JSON encoding shared by lux.py and luxserver.py.
+
+Each message on the socket is a 4-byte big-endian length followed by that many bytes of payload,
+so the reader knows when a message is complete without the writer having to close its side.
+"""
+
+import json
+import struct
+
+# Use orjson for (de)serialization if it is installed, since it is considerably faster than the
+# standard library; otherwise fall back to json. Either way, dumps returns UTF-8 bytes.
+try:
+    import orjson
+    dumps = orjson.dumps
+    loads = orjson.loads
+except ImportError:
+    def dumps(obj):
+        """Returns the compact JSON encoding of obj as UTF-8 bytes."""
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    loads = json.loads
+
+# Length header: one unsigned 32-bit int, network byte order
+_HEADER = struct.Struct("!I")
+
+# Most bytes requested from the socket per recv call
+_RECV_SIZE = 65536
+
+
+def _sendmsg_all(sock, buffers):
+    """Sends every buffer in buffers over sock with as few sendmsg calls as possible."""
+    views = [memoryview(buffer) for buffer in buffers if len(buffer)]
+    first = 0
+    while first < len(views):
+        sent = sock.sendmsg(views[first:])
+        # Skip the buffers that were sent in full and trim the one that was sent in part
+        while first < len(views) and sent >= len(views[first]):
+            sent -= len(views[first])
+            first += 1
+        if sent:
+            views[first] = views[first][sent:]
+
+
+def send_message(sock, payload):
+    """Sends the bytes in payload over sock, prefixed with its length."""
+    header = _HEADER.pack(len(payload))
+    if hasattr(sock, "sendmsg"):
+        # Send header and payload together without copying the payload to prepend the header
+        _sendmsg_all(sock, [header, payload])
+    else:
+        # Platforms without sendmsg (e.g. Windows) get one joined buffer instead
+        sock.sendall(header + payload)
+
+
+def _recv_exact(sock, n):
+    """Receives exactly n bytes from sock into a bytearray, raising ConnectionError if the peer
+    closes early.
+    """
+    # Receive straight into a preallocated buffer instead of concatenating immutable chunks
+    buf = bytearray(n)
+    view = memoryview(buf)
+    received = 0
+    while received < n:
+        count = sock.recv_into(view[received:], min(n - received, _RECV_SIZE))
+        if not count:
+            raise ConnectionError("Connection closed before the full message was received")
+        received += count
+    return buf
+
+
+def recv_message(sock, max_size=None):
+    """Receives one length-prefixed message from sock and returns its payload (a bytearray).
+    If max_size is given, raises ValueError before reading the body when the header announces a
+    larger payload, so a peer cannot make the reader allocate an arbitrarily large buffer.
+    """
+    (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if max_size is not None and length > max_size:
+        raise ValueError(f"Message of {length} bytes exceeds the limit of {max_size} bytes")
+    return _recv_exact(sock, length)